@@ -1,36 +1,140 @@
 import os
+import re
 import time
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import requests
-import keyboard
+from requests.adapters import HTTPAdapter
+try:
+    from pynput import keyboard as pynput_keyboard
+except ImportError:
+    pynput_keyboard = None
+try:
+    import keyboard
+except ImportError:
+    keyboard = None
 import logging
 import argparse
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 CONFIG_FILE = ".env"
-# Dictionary to store the last known state of each device keyed by device_id.
+# Last known device states, so startup does not have to wait on the bridge.
+STATE_FILE = ".state.json"
+# Serializes writes to STATE_FILE from the executor threads.
+_state_file_lock = threading.Lock()
+# Last known state of each device keyed by device_id. Each value is a [on, toggles]
+# list holding the on/off state and the number of toggles made since startup,
+# so hotkey callbacks can keep a reference to it.
 device_states = {}
+# Time of the last accepted hotkey press keyed by toggle target, used for debouncing.
+_last_press = {}
+# Presses for the same device closer together than this (in seconds) are ignored.
+DEBOUNCE_SECONDS = 0.15
+# Names used by the keyboard library that are spelled differently in pynput.
+# Other multi-word names are converted by replacing spaces with underscores.
+_PYNPUT_KEY_ALIASES = {
+    "control": "ctrl",
+    "left ctrl": "ctrl_l",
+    "right ctrl": "ctrl_r",
+    "left shift": "shift_l",
+    "right shift": "shift_r",
+    "left alt": "alt_l",
+    "right alt": "alt_r",
+    "windows": "cmd",
+    "win": "cmd",
+    "command": "cmd",
+    "left windows": "cmd_l",
+    "right windows": "cmd_r",
+    "escape": "esc",
+    "return": "enter",
+    "del": "delete",
+    "ins": "insert",
+    "pgup": "page_up",
+    "pgdn": "page_down",
+    "prtscn": "print_screen",
+    "play/pause media": "media_play_pause",
+    "next track": "media_next",
+    "previous track": "media_previous",
+}
+# Matches KEY=VALUE lines in CONFIG_FILE, skipping comment lines. Like python-dotenv,
+# an optional "export " prefix and whitespace around the key and value are ignored.
+_CONFIG_LINE_RE = re.compile(r"(?m)^[ \t]*(?:export[ \t]+)?([^=\s#][^=\n]*?)[ \t]*=[ \t]*(.*?)[ \t]*$")
+# Name prefix of the Hue groups created for devices that share a hotkey. Which groups
+# this configuration created is tracked by id in HUE_GROUPS, not by this name.
+GROUP_NAME_PREFIX = "hueshortcut "
+# Parsed contents of CONFIG_FILE, populated on first use by _load_config().
+_config_cache = None
+
+def _json_loads(data):
+    """Decodes JSON using orjson when available, falling back to the standard library."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj):
+    """Encodes JSON to a string using orjson when available, falling back to the standard library."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+# Shared HTTP session so every call to the bridge reuses the same keep-alive connection.
+# The bridge's local API only speaks plain HTTP/1.1, so keep-alive is what avoids the
+# per-request connection setup; HTTP/2 multiplexing is not available here.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+# (connect, read) timeout in seconds for requests made while the script is running.
+HTTP_TIMEOUT = (1.0, 2.0)
+
+# Single background worker that sends toggle requests off the hotkey callback thread.
+# One worker keeps the PUTs in press order, so the bridge cannot apply ON and OFF swapped.
+_PUT_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+# Background worker for other work (saving states, refreshing from the bridge),
+# so it never delays a toggle request.
+_EXECUTOR = ThreadPoolExecutor(max_workers=1)
 
 # Configure logging to output to the console.
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
     handlers=[logging.StreamHandler()]
 )
+logger = logging.getLogger(__name__)
+
+def _unquote(value):
+    """Strips a matching pair of single or double quotes around a .env value."""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+def _load_config():
+    """
+    Returns the parsed .env configuration as a dictionary.
+    The file is read only once; later calls return the cached dictionary.
+    """
+    global _config_cache
+    if _config_cache is None:
+        _config_cache = {}
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                _config_cache = {k: _unquote(v) for k, v in _CONFIG_LINE_RE.findall(f.read())}
+    return _config_cache
+
+def _write_config(config):
+    """Writes the given configuration to the .env file and refreshes the cache."""
+    global _config_cache
+    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+        f.write("\n".join(f"{k}={v}" for k, v in config.items()) + "\n")
+    _config_cache = config
 
 def update_config_value(key, value):
     """Update a key-value pair in the .env configuration file."""
-    config = {}
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            for line in f:
-                if '=' in line:
-                    k, v = line.strip().split("=", 1)
-                    config[k] = v
+    config = _load_config()
     config[key] = value
-    with open(CONFIG_FILE, "w") as f:
-        for k, v in config.items():
-            f.write(f"{k}={v}\n")
+    _write_config(config)
 
 def register_hue_username(bridge_ip, device_type="hueshortcut#pc", timeout=30):
     """
@@ -39,26 +143,29 @@ def register_hue_username(bridge_ip, device_type="hueshortcut#pc", timeout=30):
     """
     url = f"http://{bridge_ip}/api"
     payload = {"devicetype": device_type}
-    logging.info("Attempting to register with the Hue Bridge. Please press the link button on your bridge.")
+    logger.info("Attempting to register with the Hue Bridge. Please press the link button on your bridge.")
     
-    start_time = time.time()
-    while time.time() - start_time < timeout:
+    # Poll quickly at first and back off, so a button press is picked up almost immediately.
+    delay = 0.25
+    start_time = time.monotonic()
+    while time.monotonic() - start_time < timeout:
         try:
-            response = requests.post(url, json=payload, timeout=5)
-            result = response.json()
-            logging.debug("Received registration response: %s", result)
+            response = SESSION.post(url, json=payload, timeout=5)
+            result = _json_loads(response.content)
+            logger.debug("Received registration response: %s", result)
             if isinstance(result, list) and "success" in result[0]:
                 username = result[0]["success"]["username"]
-                logging.info("Registration successful. Username: %s", username)
+                logger.info("Registration successful. Username: %s", username)
                 return username
             else:
                 error = result[0].get("error", {}).get("description", "Waiting for link button press...")
-                logging.warning("Registration response: %s", error)
+                logger.warning("Registration response: %s", error)
         except Exception as e:
-            logging.exception("Error during registration: %s", e)
-        time.sleep(2)
+            logger.exception("Error during registration: %s", e)
+        time.sleep(delay)
+        delay = min(delay * 1.5, 1.5)
     
-    logging.error("Failed to register with the Hue Bridge within the timeout period.")
+    logger.error("Failed to register with the Hue Bridge within the timeout period.")
     return None
 
 def update_username():
@@ -72,8 +179,8 @@ def update_username():
         print("No configuration found. Run the full setup first.")
         return
 
-    load_dotenv(CONFIG_FILE)
-    bridge_ip = os.getenv("HUE_BRIDGE_IP")
+    config = _load_config()
+    bridge_ip = config.get("HUE_BRIDGE_IP")
     if not bridge_ip:
         print("HUE_BRIDGE_IP not found in configuration. Please run the full setup.")
         return
@@ -83,8 +190,8 @@ def update_username():
         new_username = input("Enter your Hue API username: ").strip()
         test_url = f"http://{bridge_ip}/api/{new_username}/lights"
         try:
-            response = requests.get(test_url, timeout=5)
-            result = response.json()
+            response = SESSION.get(test_url, timeout=5)
+            result = _json_loads(response.content)
             if isinstance(result, dict) and result:
                 print("Username is valid.")
                 update_config_value("HUE_USERNAME", new_username)
@@ -110,15 +217,15 @@ def interactive_device_setup(bridge_ip, username):
     """
     url = f"http://{bridge_ip}/api/{username}/lights"
     try:
-        response = requests.get(url)
-        devices = response.json()  # dict: device_id -> device info
-        logging.debug("Retrieved devices: %s", devices)
+        response = SESSION.get(url, timeout=HTTP_TIMEOUT)
+        devices = _json_loads(response.content)  # dict: device_id -> device info
+        logger.debug("Retrieved devices: %s", devices)
     except Exception as e:
-        logging.exception("Error retrieving devices: %s", e)
+        logger.exception("Error retrieving devices: %s", e)
         return None
 
     if not devices:
-        logging.error("No devices found!")
+        logger.error("No devices found!")
         return None
 
     configured_devices = []
@@ -140,13 +247,81 @@ def interactive_device_setup(bridge_ip, username):
             break
     return configured_devices
 
+def assign_hotkey_groups(bridge_ip, username, configured_devices, owned_group_ids=()):
+    """
+    Finds devices that share a hotkey and stores a Hue group id on each of them,
+    so one press toggles them all with a single request to the group's action endpoint.
+    An existing group with exactly the same lights is reused, preferring the groups in
+    owned_group_ids (those this configuration created earlier); otherwise a new one is created.
+    Returns the ids of the groups this configuration owns after the assignment.
+    """
+    devices_by_hotkey = {}
+    for device in configured_devices:
+        devices_by_hotkey.setdefault(device["hotkey"], []).append(device)
+
+    url = f"http://{bridge_ip}/api/{username}/groups"
+    try:
+        groups = _json_loads(SESSION.get(url, timeout=HTTP_TIMEOUT).content)
+    except Exception as e:
+        logger.exception("Error retrieving groups: %s", e)
+        groups = {}
+    if not isinstance(groups, dict):
+        groups = {}
+
+    # Check owned groups first so they are reused rather than left to be deleted. Groups created
+    # by another installation of this script are skipped, since that installation may delete them.
+    candidates = sorted(
+        ((group_id, info) for group_id, info in groups.items()
+         if group_id in owned_group_ids or not info.get("name", "").startswith(GROUP_NAME_PREFIX)),
+        key=lambda item: item[0] not in owned_group_ids,
+    )
+    new_owned_group_ids = []
+    for hotkey, devs in devices_by_hotkey.items():
+        light_ids = sorted({device["device_id"] for device in devs})
+        if len(light_ids) < 2:
+            continue
+        group_id = None
+        for existing_id, info in candidates:
+            if sorted(info.get("lights", [])) == light_ids:
+                group_id = existing_id
+                logger.info("Using existing group %s for hotkey %s", group_id, hotkey)
+                break
+        if group_id is None:
+            # Hue group names are limited to 32 characters.
+            payload = {"name": f"{GROUP_NAME_PREFIX}{hotkey}"[:32], "lights": light_ids, "type": "LightGroup"}
+            try:
+                result = _json_loads(SESSION.post(url, json=payload, timeout=HTTP_TIMEOUT).content)
+                group_id = result[0]["success"]["id"]
+                logger.info("Created group %s for hotkey %s", group_id, hotkey)
+            except Exception as e:
+                logger.exception("Error creating group for hotkey %s, devices will be toggled individually: %s", hotkey, e)
+                continue
+            new_owned_group_ids.append(group_id)
+        elif group_id in owned_group_ids and group_id not in new_owned_group_ids:
+            new_owned_group_ids.append(group_id)
+        for device in devs:
+            device["group_id"] = group_id
+    return new_owned_group_ids
+
+def delete_groups(bridge_ip, username, group_ids):
+    """
+    Deletes the given groups from the bridge. Used for groups this configuration
+    created that are no longer used, since the bridge only supports a limited number of groups.
+    """
+    for group_id in group_ids:
+        try:
+            SESSION.delete(f"http://{bridge_ip}/api/{username}/groups/{group_id}", timeout=HTTP_TIMEOUT)
+            logger.info("Deleted unused group %s", group_id)
+        except Exception as e:
+            logger.exception("Error deleting unused group %s: %s", group_id, e)
+
 def interactive_setup():
     """
     Interactive configuration:
     - Prompts for the Hue Bridge IP address.
     - Asks if you want to use an existing Hue API username or register automatically.
     - Invokes device setup to add multiple devices with individual hotkeys.
-    - Saves HUE_BRIDGE_IP, HUE_USERNAME, and DEVICES to the .env file.
+    - Saves HUE_BRIDGE_IP, HUE_USERNAME, DEVICES, and HUE_GROUPS to the .env file.
     """
     bridge_ip = input("Enter your Hue Bridge IP address: ").strip()
 
@@ -155,8 +330,8 @@ def interactive_setup():
         username = input("Enter your Hue API username: ").strip()
         test_url = f"http://{bridge_ip}/api/{username}/lights"
         try:
-            response = requests.get(test_url, timeout=5)
-            result = response.json()
+            response = SESSION.get(test_url, timeout=5)
+            result = _json_loads(response.content)
             if isinstance(result, dict) and result:
                 print("Username is valid. Using provided username.")
             else:
@@ -169,103 +344,279 @@ def interactive_setup():
         username = register_hue_username(bridge_ip)
 
     if not username:
-        logging.error("Could not register with the Hue Bridge.")
+        logger.error("Could not register with the Hue Bridge.")
         return False
 
     devices_config = interactive_device_setup(bridge_ip, username)
     if not devices_config or len(devices_config) == 0:
-        logging.error("No devices configured.")
+        logger.error("No devices configured.")
         return False
 
-    with open(CONFIG_FILE, "w") as f:
-        f.write(f"HUE_BRIDGE_IP={bridge_ip}\n")
-        f.write(f"HUE_USERNAME={username}\n")
-        f.write(f"DEVICES={json.dumps(devices_config)}\n")
-    logging.info("Configuration saved to %s", CONFIG_FILE)
+    owned_group_ids = assign_hotkey_groups(bridge_ip, username, devices_config)
+    _write_config({
+        "HUE_BRIDGE_IP": bridge_ip,
+        "HUE_USERNAME": username,
+        "DEVICES": _json_dumps(devices_config),
+        "HUE_GROUPS": _json_dumps(owned_group_ids),
+    })
+    logger.info("Configuration saved to %s", CONFIG_FILE)
     return True
 
 def edit_devices():
     """
     Allows editing of the configured devices.
     Loads the current HUE_BRIDGE_IP and HUE_USERNAME, then re-runs the interactive device setup.
-    Updates the DEVICES configuration in the .env file.
+    Updates the DEVICES configuration in the .env file, and deletes the groups
+    this configuration created (HUE_GROUPS) that the new devices no longer use.
     """
     if not os.path.exists(CONFIG_FILE):
-        logging.error("Configuration file not found. Run the script without '--edit' first.")
+        logger.error("Configuration file not found. Run the script without '--edit' first.")
         return
 
-    load_dotenv(CONFIG_FILE)
-    bridge_ip = os.getenv("HUE_BRIDGE_IP")
-    username = os.getenv("HUE_USERNAME")
+    config = _load_config()
+    bridge_ip = config.get("HUE_BRIDGE_IP")
+    username = config.get("HUE_USERNAME")
     if not (bridge_ip and username):
-        logging.error("Missing HUE_BRIDGE_IP or HUE_USERNAME in configuration. Cannot edit devices.")
+        logger.error("Missing HUE_BRIDGE_IP or HUE_USERNAME in configuration. Cannot edit devices.")
         return
 
     new_devices_config = interactive_device_setup(bridge_ip, username)
     if not new_devices_config or len(new_devices_config) == 0:
-        logging.error("No devices configured.")
+        logger.error("No devices configured.")
         return
 
-    # Read current configuration to preserve other keys.
-    config = {}
-    with open(CONFIG_FILE, "r") as f:
-        for line in f:
-            if '=' in line:
-                key, value = line.strip().split("=", 1)
-                config[key] = value
-    config["DEVICES"] = json.dumps(new_devices_config)
+    try:
+        old_owned_group_ids = _json_loads(config.get("HUE_GROUPS") or "[]")
+    except Exception as e:
+        logger.exception("Error parsing HUE_GROUPS configuration, no groups will be deleted: %s", e)
+        old_owned_group_ids = []
+    owned_group_ids = assign_hotkey_groups(bridge_ip, username, new_devices_config, old_owned_group_ids)
+
+    # Reuse the loaded configuration to preserve other keys.
+    config["DEVICES"] = _json_dumps(new_devices_config)
+    config["HUE_GROUPS"] = _json_dumps(owned_group_ids)
+    _write_config(config)
+    logger.info("Device configuration updated.")
+
+    # Only delete groups once the configuration no longer refers to them.
+    delete_groups(bridge_ip, username, [g for g in old_owned_group_ids if g not in owned_group_ids])
 
-    with open(CONFIG_FILE, "w") as f:
-        for key, value in config.items():
-            f.write(f"{key}={value}\n")
-    logging.info("Device configuration updated.")
+def _state_ref(device_id):
+    """Returns the mutable [on, toggles] state holder for the given device, creating it if needed."""
+    return device_states.setdefault(device_id, [False, 0])
+
+def _set_refreshed_state(device_id, state, toggles_seen=None):
+    """
+    Stores a state read from the bridge, unless the device was toggled after the
+    read started (toggles_seen is its toggle count at that time), since the
+    bridge's answer may predate that toggle.
+    """
+    state_ref = _state_ref(device_id)
+    if toggles_seen is not None and state_ref[1] != toggles_seen:
+        logger.debug("Device %s was toggled during the refresh. Keeping its current state.", device_id)
+        return
+    logger.info("Initial state for device %s: %s", device_id, "ON" if state else "OFF")
+    state_ref[0] = state
 
-def initialize_state(bridge_ip, username, device_id):
+def initialize_state(bridge_ip, username, device_id, toggles_seen=None):
     """
     Retrieves the current state of a device and stores it in the global device_states dictionary.
+    See _set_refreshed_state for toggles_seen.
     """
-    global device_states
     state_url = f"http://{bridge_ip}/api/{username}/lights/{device_id}"
     try:
-        res = requests.get(state_url)
-        data = res.json()
+        res = SESSION.get(state_url, timeout=HTTP_TIMEOUT)
+        data = _json_loads(res.content)
         state = data["state"].get("on", False)
-        logging.info("Initial state for device %s: %s", device_id, "ON" if state else "OFF")
-        device_states[device_id] = state
+        _set_refreshed_state(device_id, state, toggles_seen)
+    except Exception as e:
+        logger.exception("Error initializing state for device %s: %s", device_id, e)
+        _state_ref(device_id)
+
+def load_saved_states():
+    """Loads the device states saved by a previous run into the global device_states dictionary."""
+    if not os.path.exists(STATE_FILE):
+        return
+    try:
+        with open(STATE_FILE, "r") as f:
+            for device_id, state in _json_loads(f.read()).items():
+                _state_ref(device_id)[0] = state
+    except Exception as e:
+        logger.exception("Error loading saved device states: %s", e)
+
+def save_states():
+    """Writes the current device_states dictionary to the state file."""
+    with _state_file_lock:
+        try:
+            with open(STATE_FILE, "w") as f:
+                f.write(_json_dumps({device_id: ref[0] for device_id, ref in list(device_states.items())}))
+        except Exception as e:
+            logger.exception("Error saving device states: %s", e)
+
+def refresh_states(bridge_ip, username, device_ids):
+    """Refreshes the given devices' states from the bridge and saves them for the next run."""
+    initialize_all_states(bridge_ip, username, device_ids)
+    save_states()
+
+def initialize_all_states(bridge_ip, username, device_ids):
+    """
+    Retrieves the current state of all given devices with a single request to the
+    bridge's /lights endpoint. Falls back to per-device requests only for devices
+    missing from a successful response; if the request itself fails, the stored
+    states are left as they are. Devices toggled while the request is in flight
+    keep their toggled state.
+    """
+    toggles_seen = {device_id: _state_ref(device_id)[1] for device_id in device_ids}
+    url = f"http://{bridge_ip}/api/{username}/lights"
+    try:
+        lights = _json_loads(SESSION.get(url, timeout=HTTP_TIMEOUT).content)
     except Exception as e:
-        logging.exception("Error initializing state for device %s: %s", device_id, e)
-        device_states[device_id] = False
+        logger.exception("Error retrieving device states: %s", e)
+        return
+    if not isinstance(lights, dict):
+        # The bridge returns a list of errors when the request is rejected.
+        logger.warning("Unexpected response when retrieving device states: %s", lights)
+        return
+    for device_id in device_ids:
+        try:
+            state = lights[device_id]["state"].get("on", False)
+        except KeyError:
+            initialize_state(bridge_ip, username, device_id, toggles_seen[device_id])
+            continue
+        _set_refreshed_state(device_id, state, toggles_seen[device_id])
 
-def toggle_device(bridge_ip, username, device_id):
+def _confirm_toggle(target, future):
     """
-    Toggles the state of the given device using the stored state,
-    then confirms the new state via a GET request.
+    Done-callback for a toggle PUT submitted to the executor.
+    Logs the confirmed state from the bridge's response, or the error that occurred.
     """
-    global device_states
-    current_state = device_states.get(device_id, False)
-    new_state = not current_state
-    logging.info("Toggling device %s to %s", device_id, "ON" if new_state else "OFF")
-    command_url = f"http://{bridge_ip}/api/{username}/lights/{device_id}/state"
-    payload = {"on": new_state}
     try:
-        res = requests.put(command_url, json=payload)
-        logging.debug("Response from bridge: %s", res.json())
-        device_states[device_id] = new_state
-        # Confirm the new state.
-        confirm_url = f"http://{bridge_ip}/api/{username}/lights/{device_id}"
-        confirm_res = requests.get(confirm_url)
-        confirm_data = confirm_res.json()
-        confirmed_state = confirm_data["state"].get("on", False)
-        logging.info("Confirmed state for device %s: %s", device_id, "ON" if confirmed_state else "OFF")
+        res = future.result()
+        result = _json_loads(res.content)
+        logger.debug("Response from bridge: %s", result)
+        # Confirm the new state from the success entry, e.g. {"success": {"/lights/1/state/on": true}}
+        # or {"success": {"/groups/1/action/on": true}}.
+        confirmed_state = None
+        for item in result if isinstance(result, list) else []:
+            for key, value in item.get("success", {}).items():
+                if key.endswith("/on"):
+                    confirmed_state = value
+        if confirmed_state is None:
+            logger.warning("Bridge did not confirm the new state for %s: %s", target, result)
+        else:
+            logger.info("Confirmed state for %s: %s", target, "ON" if confirmed_state else "OFF")
     except Exception as e:
-        logging.exception("Error toggling device %s: %s", device_id, e)
+        logger.exception("Error toggling %s: %s", target, e)
+
+def toggle_device(target, state_refs, command_url):
+    """
+    Toggles a device, or a group of devices, using the stored state.
+    target is a label for logging (e.g. "device 1" or "group 2"),
+    state_refs are the [on, toggles] holders from device_states for every device it covers and
+    command_url is its precomputed /state or group /action endpoint.
+    The PUT is sent in the background so the hotkey callback returns immediately;
+    the new state is confirmed from the bridge's response once it arrives.
+    """
+    new_state = not state_refs[0][0]
+    for state_ref in state_refs:
+        state_ref[0] = new_state
+        state_ref[1] += 1
+    logger.info("Toggling %s to %s", target, "ON" if new_state else "OFF")
+    payload = {"on": new_state}
+    future = _PUT_EXECUTOR.submit(SESSION.put, command_url, json=payload, timeout=HTTP_TIMEOUT)
+    future.add_done_callback(lambda f, target=target: _confirm_toggle(target, f))
+    _EXECUTOR.submit(save_states)
+
+def on_hotkey(targets):
+    """
+    Hotkey callback that toggles each (target, state_refs, command_url) in targets,
+    ignoring presses arriving within DEBOUNCE_SECONDS of the previous press for the same target.
+    """
+    now = time.monotonic()
+    for target, state_refs, command_url in targets:
+        if now - _last_press.get(target, 0) < DEBOUNCE_SECONDS:
+            logger.debug("Ignoring repeated hotkey press for %s", target)
+            continue
+        _last_press[target] = now
+        toggle_device(target, state_refs, command_url)
+
+def to_pynput_hotkey(hotkey):
+    """
+    Converts a hotkey in the keyboard library's format (e.g. "ctrl+shift+l" or "ctrl+page up")
+    to pynput's format (e.g. "<ctrl>+<shift>+l" or "<ctrl>+<page_up>").
+    Raises ValueError for hotkeys pynput cannot express, such as multi-step hotkeys ("ctrl+k, ctrl+l").
+    """
+    if "," in hotkey:
+        raise ValueError(hotkey)
+    parts = []
+    for part in hotkey.lower().split("+"):
+        part = " ".join(part.split())
+        part = _PYNPUT_KEY_ALIASES.get(part, part.replace(" ", "_"))
+        if not part:
+            raise ValueError(hotkey)
+        parts.append(part if len(part) == 1 else f"<{part}>")
+    return "+".join(parts)
+
+def _call_all(callbacks):
+    """Calls each callback bound to a single hotkey."""
+    for callback in callbacks:
+        callback()
+
+def run_hotkeys(bindings):
+    """
+    Binds each hotkey in the given dictionary (hotkey -> list of callbacks) and blocks until ESC is pressed.
+    Uses pynput's OS-level hooks when available and falls back to the keyboard library.
+    """
+    if pynput_keyboard is not None:
+        esc_keys = frozenset(pynput_keyboard.HotKey.parse("<esc>"))
+        # Callbacks keyed by the parsed key combination, so hotkeys written differently
+        # in the configuration (e.g. "Ctrl+L" and "ctrl+l") end up on the same binding.
+        combos = {}
+        for hotkey, callbacks in bindings.items():
+            try:
+                pynput_hotkey = to_pynput_hotkey(hotkey)
+                keys = frozenset(pynput_keyboard.HotKey.parse(pynput_hotkey))
+            except ValueError:
+                if keyboard is None:
+                    logger.error("Hotkey %s is not supported by pynput and keyboard is not installed. Skipping it.", hotkey)
+                else:
+                    logger.warning("Hotkey %s is not supported by pynput. Binding it with keyboard instead.", hotkey)
+                    for callback in callbacks:
+                        keyboard.add_hotkey(hotkey, callback)
+                continue
+            if keys == esc_keys:
+                logger.error("Hotkey %s conflicts with the ESC exit key. Skipping it.", hotkey)
+                continue
+            if keys in combos:
+                logger.warning("Hotkey %s is the same key combination as %s. Both are bound to it.", hotkey, combos[keys][0])
+                combos[keys][2].extend(callbacks)
+            else:
+                combos[keys] = (hotkey, pynput_hotkey, list(callbacks))
+        hotkeys = {pynput_hotkey: (lambda callbacks=callbacks: _call_all(callbacks)) for _, pynput_hotkey, callbacks in combos.values()}
+        hotkeys["<esc>"] = lambda: listener.stop()
+        listener = pynput_keyboard.GlobalHotKeys(hotkeys)
+        logger.info("Monitoring for hotkey presses. Press ESC to exit.")
+        with listener:
+            listener.join()
+    elif keyboard is not None:
+        for hotkey, callbacks in bindings.items():
+            for callback in callbacks:
+                keyboard.add_hotkey(hotkey, callback)
+        logger.info("Monitoring for hotkey presses. Press ESC to exit.")
+        keyboard.wait("esc")
+    else:
+        logger.error("Neither pynput nor keyboard is installed. Install one of them to use hotkeys.")
 
 def main():
     parser = argparse.ArgumentParser(description="Hue Shortcut Script with Multiple Devices")
     parser.add_argument("--edit", action="store_true", help="Edit the configured devices")
     parser.add_argument("--username", action="store_true", help="Update the Hue API username and reconnect to the bridge")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging, including raw bridge responses")
     args = parser.parse_args()
 
+    if args.debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+
     if args.username:
         update_username()
         return
@@ -279,34 +630,51 @@ def main():
         if not interactive_setup():
             return
 
-    load_dotenv(CONFIG_FILE)
-    bridge_ip = os.getenv("HUE_BRIDGE_IP")
-    username = os.getenv("HUE_USERNAME")
-    devices_str = os.getenv("DEVICES")
+    config = _load_config()
+    bridge_ip = config.get("HUE_BRIDGE_IP")
+    username = config.get("HUE_USERNAME")
+    devices_str = config.get("DEVICES")
     if not (bridge_ip and username and devices_str):
-        logging.error("Missing configuration values. Please re-run the setup.")
+        logger.error("Missing configuration values. Please re-run the setup.")
         return
 
     try:
-        devices = json.loads(devices_str)
+        devices = _json_loads(devices_str)
     except Exception as e:
-        logging.exception("Error parsing devices configuration: %s", e)
+        logger.exception("Error parsing devices configuration: %s", e)
         return
 
     if not devices or len(devices) == 0:
-        logging.error("No devices configured. Please run the setup again.")
+        logger.error("No devices configured. Please run the setup again.")
         return
 
-    # Initialize state for each configured device and bind their hotkeys.
+    # Start from the states saved by the last run, bind the hotkeys, and refresh
+    # the states from the bridge in the background.
+    load_saved_states()
+    # Devices sharing a hotkey are toggled together, with a single group request when they have a group.
+    devices_by_hotkey = {}
     for device in devices:
-        device_id = device["device_id"]
-        initialize_state(bridge_ip, username, device_id)
-        hotkey = device["hotkey"]
-        logging.info("Registering hotkey %s for device %s (%s)", hotkey, device_id, device.get("name", "Unknown"))
-        keyboard.add_hotkey(hotkey, lambda device_id=device_id: toggle_device(bridge_ip, username, device_id))
-
-    logging.info("Monitoring for hotkey presses. Press ESC to exit.")
-    keyboard.wait("esc")
+        devices_by_hotkey.setdefault(device["hotkey"], []).append(device)
+    bindings = {}
+    for hotkey, hotkey_devices in devices_by_hotkey.items():
+        group_id = hotkey_devices[0].get("group_id")
+        if len(hotkey_devices) > 1 and group_id and all(d.get("group_id") == group_id for d in hotkey_devices):
+            names = ", ".join(d.get("name", "Unknown") for d in hotkey_devices)
+            logger.info("Registering hotkey %s for group %s (%s)", hotkey, group_id, names)
+            cmd_url = f"http://{bridge_ip}/api/{username}/groups/{group_id}/action"
+            state_refs = [_state_ref(d["device_id"]) for d in hotkey_devices]
+            targets = [(f"group {group_id}", state_refs, cmd_url)]
+        else:
+            targets = []
+            for device in hotkey_devices:
+                device_id = device["device_id"]
+                device["_cmd_url"] = f"http://{bridge_ip}/api/{username}/lights/{device_id}/state"
+                logger.info("Registering hotkey %s for device %s (%s)", hotkey, device_id, device.get("name", "Unknown"))
+                targets.append((f"device {device_id}", [_state_ref(device_id)], device["_cmd_url"]))
+        bindings.setdefault(hotkey, []).append(lambda targets=targets: on_hotkey(targets))
+
+    _EXECUTOR.submit(refresh_states, bridge_ip, username, [device["device_id"] for device in devices])
+    run_hotkeys(bindings)
 
 if __name__ == '__main__':
     main()